@@ -1,7 +1,18 @@
 """Global test configuration."""
 
+import os
+import pathlib
+
 import pytest
 
+# Point the compilation caches at a workspace-local directory shared by
+# the whole suite, so repeated runs (and CI cache restores) skip the
+# TSFC and PyOP2 JIT cost.  This must happen before firedrake is first
+# imported; explicitly set environment variables take precedence.
+_cache_root = pathlib.Path(__file__).parent / ".compilation_cache"
+os.environ.setdefault("PYOP2_CACHE_DIR", str(_cache_root / "pyop2"))
+os.environ.setdefault("FIREDRAKE_TSFC_KERNEL_CACHE_DIR", str(_cache_root / "tsfc"))
+
 
 def pytest_configure(config):
     """Register an additional marker."""
@@ -23,6 +34,9 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers",
         "skipnetgen: mark as skipped if netgen and ngsPETSc is not installed")
+    config.addinivalue_line(
+        "markers",
+        "slow: mark as slow, deselect with '-m \"not slow\"'")
 
 
 def pytest_collection_modifyitems(session, config, items):
@@ -1,70 +1,92 @@
 from firedrake import *
+import functools
 import numpy
 import pytest
 import warnings
 
 
+@functools.lru_cache(maxsize=None)
+def _cached_mh(nx, ny, nlevel, refinements_per_level=1):
+    # The hierarchies in this module are never mutated, so they can be
+    # shared between fixtures requesting the same refinement structure.
+    return MeshHierarchy(UnitSquareMesh(nx, ny), nlevel,
+                         refinements_per_level=refinements_per_level)
+
+
+_MG = {"snes_type": "ksponly",
+       "ksp_type": "preonly",
+       "mat_type": "aij",
+       "pc_type": "mg",
+       "pc_mg_type": "full",
+       "mg_levels_ksp_type": "chebyshev",
+       "mg_levels_ksp_chebyshev_esteig_steps": 5,
+       "mg_levels_ksp_max_it": 2,
+       "mg_levels_pc_type": "jacobi"}
+
+_MGMATFREE = {"snes_type": "ksponly",
+              "ksp_type": "preonly",
+              "mat_type": "matfree",
+              "pc_type": "mg",
+              "pc_mg_type": "full",
+              "mg_coarse_ksp_type": "preonly",
+              "mg_coarse_pc_type": "python",
+              "mg_coarse_pc_python_type": "firedrake.AssembledPC",
+              "mg_coarse_assembled_pc_type": "cholesky",
+              "mg_levels_ksp_type": "chebyshev",
+              "mg_levels_ksp_chebyshev_esteig_steps": 5,
+              "mg_levels_ksp_max_it": 2,
+              "mg_levels_pc_type": "jacobi"}
+
+_FAS = {"snes_type": "fas",
+        "snes_fas_type": "full",
+        "fas_coarse_snes_type": "ksponly",
+        "fas_coarse_ksp_type": "preonly",
+        "fas_coarse_pc_type": "redundant",
+        "fas_coarse_redundant_pc_type": "cholesky",
+        "fas_levels_snes_type": "ksponly",
+        "fas_levels_ksp_type": "chebyshev",
+        "fas_levels_ksp_chebyshev_esteig_steps": 5,
+        "fas_levels_ksp_max_it": 3,
+        "fas_levels_pc_type": "jacobi",
+        "fas_levels_ksp_convergence_test": "skip",
+        "snes_max_it": 1,
+        "snes_convergence_test": "skip"}
+
+_NEWTONFAS = {"snes_type": "newtonls",
+              "ksp_type": "preonly",
+              "pc_type": "none",
+              "snes_linesearch_type": "l2",
+              "snes_max_it": 1,
+              "snes_convergence_test": "skip",
+              "npc_snes_type": "fas",
+              "npc_snes_fas_type": "full",
+              "npc_fas_coarse_snes_type": "ksponly",
+              "npc_fas_coarse_ksp_type": "preonly",
+              "npc_fas_coarse_pc_type": "redundant",
+              "npc_fas_coarse_redundant_pc_type": "cholesky",
+              "npc_fas_coarse_snes_linesearch_type": "basic",
+              "npc_fas_levels_snes_type": "ksponly",
+              "npc_fas_levels_ksp_type": "chebyshev",
+              "npc_fas_levels_ksp_chebyshev_esteig_steps": 5,
+              "npc_fas_levels_ksp_max_it": 2,
+              "npc_fas_levels_pc_type": "jacobi",
+              "npc_fas_levels_ksp_convergence_test": "skip",
+              "npc_snes_max_it": 1,
+              "npc_snes_convergence_test": "skip"}
+
+_PARAMS = {"mg": _MG,
+           "mgmatfree": _MGMATFREE,
+           "fas": _FAS,
+           "newtonfas": _NEWTONFAS}
+
+
 def solver_parameters(solver_type):
-    if solver_type == "mg":
-        parameters = {"snes_type": "ksponly",
-                      "ksp_type": "preonly",
-                      "mat_type": "aij",
-                      "pc_type": "mg",
-                      "pc_mg_type": "full",
-                      "mg_levels_ksp_type": "chebyshev",
-                      "mg_levels_ksp_max_it": 2,
-                      "mg_levels_pc_type": "jacobi"}
-    elif solver_type == "mgmatfree":
-        parameters = {"snes_type": "ksponly",
-                      "ksp_type": "preonly",
-                      "mat_type": "matfree",
-                      "pc_type": "mg",
-                      "pc_mg_type": "full",
-                      "mg_coarse_ksp_type": "preonly",
-                      "mg_coarse_pc_type": "python",
-                      "mg_coarse_pc_python_type": "firedrake.AssembledPC",
-                      "mg_coarse_assembled_pc_type": "lu",
-                      "mg_levels_ksp_type": "chebyshev",
-                      "mg_levels_ksp_max_it": 2,
-                      "mg_levels_pc_type": "jacobi"}
-    elif solver_type == "fas":
-        parameters = {"snes_type": "fas",
-                      "snes_fas_type": "full",
-                      "fas_coarse_snes_type": "ksponly",
-                      "fas_coarse_ksp_type": "preonly",
-                      "fas_coarse_pc_type": "redundant",
-                      "fas_coarse_redundant_pc_type": "lu",
-                      "fas_levels_snes_type": "ksponly",
-                      "fas_levels_ksp_type": "chebyshev",
-                      "fas_levels_ksp_max_it": 3,
-                      "fas_levels_pc_type": "jacobi",
-                      "fas_levels_ksp_convergence_test": "skip",
-                      "snes_max_it": 1,
-                      "snes_convergence_test": "skip"}
-    elif solver_type == "newtonfas":
-        parameters = {"snes_type": "newtonls",
-                      "ksp_type": "preonly",
-                      "pc_type": "none",
-                      "snes_linesearch_type": "l2",
-                      "snes_max_it": 1,
-                      "snes_convergence_test": "skip",
-                      "npc_snes_type": "fas",
-                      "npc_snes_fas_type": "full",
-                      "npc_fas_coarse_snes_type": "ksponly",
-                      "npc_fas_coarse_ksp_type": "preonly",
-                      "npc_fas_coarse_pc_type": "redundant",
-                      "npc_fas_coarse_redundant_pc_type": "lu",
-                      "npc_fas_coarse_snes_linesearch_type": "basic",
-                      "npc_fas_levels_snes_type": "ksponly",
-                      "npc_fas_levels_ksp_type": "chebyshev",
-                      "npc_fas_levels_ksp_max_it": 2,
-                      "npc_fas_levels_pc_type": "jacobi",
-                      "npc_fas_levels_ksp_convergence_test": "skip",
-                      "npc_snes_max_it": 1,
-                      "npc_snes_convergence_test": "skip"}
-    else:
+    try:
+        # Return a shallow copy so that callers may mutate the
+        # parameters without clobbering the canonical sets.
+        return dict(_PARAMS[solver_type])
+    except KeyError:
         raise RuntimeError("Unknown parameter set '%s' request", solver_type)
-    return parameters
 
 
 def manufacture_solution(V):
@@ -80,20 +102,25 @@ def manufacture_solution(V):
     return exact, f
 
 
-def run_poisson(solver_type):
-    parameters = solver_parameters(solver_type)
-    mesh = UnitSquareMesh(10, 10)
-
-    nlevel = 2
-
-    mh = MeshHierarchy(mesh, nlevel)
+@pytest.fixture(scope="module")
+def poisson_setup():
+    # The mesh hierarchy, function space and manufactured solution do
+    # not depend on the solver parameters, so build them once and share
+    # them across all parametrizations.
+    mh = _cached_mh(10, 10, 2)
 
     V = FunctionSpace(mh[-1], 'CG', 2)
     exact, f = manufacture_solution(V)
+    return mh, V, f, exact
+
+
+def run_poisson(solver_type, poisson_setup):
+    parameters = solver_parameters(solver_type)
+    _, V, f, exact = poisson_setup
     u = function.Function(V)
     v = TestFunction(V)
     F = inner(grad(u), grad(v))*dx - inner(f, v)*dx
-    bcs = DirichletBC(V, 0.0, (1, 2, 3, 4))
+    bcs = DirichletBC(V, 0.0, "on_boundary")
 
     solve(F == 0, u, bcs=bcs, solver_parameters=parameters)
 
@@ -102,27 +129,27 @@ def run_poisson(solver_type):
 
 @pytest.mark.parametrize("solver_type",
                          ["mg", "mgmatfree", "fas", "newtonfas"])
-def test_poisson_gmg(solver_type):
-    assert run_poisson(solver_type) < 4e-6
+def test_poisson_gmg(solver_type, poisson_setup):
+    assert run_poisson(solver_type, poisson_setup) < 4e-6
 
 
 @pytest.mark.parallel
-def test_poisson_gmg_parallel_mg():
-    errmat = run_poisson("mg")
-    errmatfree = run_poisson("mgmatfree")
+def test_poisson_gmg_parallel_mg(poisson_setup):
+    errmat = run_poisson("mg", poisson_setup)
+    errmatfree = run_poisson("mgmatfree", poisson_setup)
     assert numpy.allclose(errmat, errmatfree)
     assert errmat < 4e-6
     assert errmatfree < 4e-6
 
 
 @pytest.mark.parallel
-def test_poisson_gmg_parallel_fas():
-    assert run_poisson("fas") < 4e-6
+def test_poisson_gmg_parallel_fas(poisson_setup):
+    assert run_poisson("fas", poisson_setup) < 4e-6
 
 
 @pytest.mark.parallel
-def test_poisson_gmg_parallel_newtonfas():
-    assert run_poisson("newtonfas") < 4e-6
+def test_poisson_gmg_parallel_newtonfas(poisson_setup):
+    assert run_poisson("newtonfas", poisson_setup) < 4e-6
 
 
 @pytest.mark.parametrize("solver_type", ["mg", "mgmatfree"])
@@ -144,7 +171,7 @@ def test_preconditioner_coarsening(solver_type):
     a = inner(alpha * grad(u), grad(v))*dx
     # Rescaled a as the preconditioner
     Jp = inner(beta * alpha * grad(u), grad(v))*dx
-    bcs = DirichletBC(V, 0.0, (1, 2, 3, 4))
+    bcs = DirichletBC(V, 0.0, "on_boundary")
     L = inner(alpha * f, v)*dx
 
     uh = function.Function(V)
@@ -167,10 +194,20 @@ def test_preconditioner_coarsening(solver_type):
     assert norm(assemble(exact - uh)) < 4e-6
 
 
+@pytest.fixture(scope="module")
+def baseform_setup():
+    # Interpolating the forcing generates and executes a kernel; do it
+    # once, its values are the same for every parametrization.
+    mh = _cached_mh(2, 2, 2, refinements_per_level=2)
+    V = FunctionSpace(mh[-1], "CG", 1)
+    _, f = manufacture_solution(V)
+    return V, f
+
+
 @pytest.mark.parametrize("solver_type",
                          ["mg", "mgmatfree", "fas", "newtonfas"])
 @pytest.mark.parametrize("mixed", [False, True], ids=["scalar", "mixed"])
-def test_baseform_coarsening(solver_type, mixed):
+def test_baseform_coarsening(solver_type, mixed, baseform_setup):
     parameters = solver_parameters(solver_type)
     parameters = dict(parameters)
     parameters["snes_rtol"] = 1.0E-10
@@ -178,11 +215,11 @@ def test_baseform_coarsening(solver_type, mixed):
     parameters["ksp_type"] = "gmres"
     parameters["ksp_rtol"] = 1.0E-12
     parameters["ksp_atol"] = 0.0
-    base = UnitSquareMesh(2, 2)
-    mh = MeshHierarchy(base, 2, refinements_per_level=2)
-    mesh = mh[-1]
-    V = FunctionSpace(mesh, "CG", 1)
-    _, f = manufacture_solution(V)
+    if parameters.get("pc_type") == "mg":
+        # With an outer Krylov iteration a V-cycle per application
+        # suffices; full multigrid is only needed by the preonly sets
+        parameters["pc_mg_type"] = "multiplicative"
+    V, f = baseform_setup
     if mixed:
         V = V * V
 
@@ -196,35 +233,57 @@ def test_baseform_coarsening(solver_type, mixed):
     a = sum(a_terms)
 
     assemble_bcs = lambda L: assemble(L, bcs=bcs, zero_bc_nodes=True)
+    # Assemble each constituent form once and reuse the cofunctions
+    # instead of re-assembling overlapping sub-sums
+    cofunctions = [assemble_bcs(form) for form in forms]
     # These are equivalent right-hand sides
     sources = [sum(forms),  # purely symbolic linear form
                assemble_bcs(sum(forms)),  # purely numerical cofunction
-               sum(assemble_bcs(form) for form in forms),  # symbolic combination of numerical cofunctions
-               forms[0] + assemble_bcs(sum(forms[1:])),  # symbolic plus numerical
+               sum(cofunctions),  # symbolic combination of numerical cofunctions
+               forms[0] + sum(cofunctions[1:]),  # symbolic plus numerical
                ]
+    # Each source must go through the variational solve so that the
+    # right-hand side is coarsened as a base form; pre-assembling it
+    # would bypass the code path under test.
+    uh = Function(V)
     solutions = []
     for L in sources:
-        uh = Function(V)
+        uh.assign(0)
         solve(a == L, uh, bcs=bcs, solver_parameters=parameters)
-        solutions.append(uh)
+        solutions.append(uh.copy(deepcopy=True))
 
+    # The solutions live in the same space, so the L2 norm of the
+    # difference can be assembled directly
     for s in solutions[1:]:
-        assert errornorm(s, solutions[0]) < 1E-14
+        diff = s - solutions[0]
+        assert assemble(inner(diff, diff)*dx)**0.5 < 1E-14
+
+
+@pytest.fixture(scope="module")
+def reinjection_setup():
+    # The hierarchy and transfer manager are independent of the solver
+    # parameters; share them across the parametrizations.
+    mh = _cached_mh(10, 10, 4)
+    return mh, TransferManager()
 
 
 @pytest.mark.parametrize("solver_type",
                          ["mg", "mgmatfree"])
-def test_reinjection_mass_then_poisson(solver_type):
+def test_reinjection_mass_then_poisson(solver_type, reinjection_setup):
     parameters = solver_parameters(solver_type)
     parameters = dict(parameters)
     parameters["ksp_type"] = "gmres"
     parameters["ksp_rtol"] = 1.0E-12
     parameters["ksp_atol"] = 0.0
-
-    base = UnitSquareMesh(10, 10)
-    nlevel = 4
-
-    mh = MeshHierarchy(base, nlevel)
+    # A V-cycle per GMRES iteration is enough here; full multigrid is
+    # only needed by the preonly sets
+    parameters["pc_mg_type"] = "multiplicative"
+    # Bound the work per solve; the reused/new solver comparison below
+    # only needs both solvers to do the same (finite) number of
+    # iterations.
+    parameters["ksp_max_it"] = 50
+
+    mh, transfer = reinjection_setup
     mesh = mh[-1]
     R = FunctionSpace(mesh, 'R', 0)
     V = FunctionSpace(mesh, 'CG', 1)
@@ -240,9 +299,8 @@ def test_reinjection_mass_then_poisson(solver_type):
     # alpha = 0 gives the mass matrix, and alpha = 1 gives Poisson
     a = lambda v, u: inner((one - alpha) * u, v)*dx + inner(alpha * grad(u), grad(v))*dx
     F = a(v, uh - uexact)
-    bcs = DirichletBC(V, 0.0, (1, 2, 3, 4))
+    bcs = DirichletBC(V, 0.0, "on_boundary")
 
-    transfer = TransferManager()
     problem = NonlinearVariationalProblem(F, uh, bcs=bcs)
     solver = NonlinearVariationalSolver(problem, solver_parameters=parameters)
     solver.set_transfer_manager(transfer)